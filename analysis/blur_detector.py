@@ -1,6 +1,20 @@
+import threading
+
 import cv2
 import numpy as np
 
+# Per-thread scratch buffers (image_selection scores images from a thread pool)
+_buffers = threading.local()
+
+
+def _buffer(name: str, shape: tuple, dtype) -> np.ndarray:
+    """Return this thread's reusable buffer, reallocating on shape change."""
+    buf = getattr(_buffers, name, None)
+    if buf is None or buf.shape != shape:
+        buf = np.empty(shape, dtype=dtype)
+        setattr(_buffers, name, buf)
+    return buf
+
 
 class BlurDetector:
     """Detects blur in images using Laplacian variance method."""
@@ -15,17 +29,22 @@ class BlurDetector:
         if frame is None:
             return float('inf')
         
+        shape = frame.shape[:2]
+        
         # Convert to grayscale if needed
         if len(frame.shape) == 3:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY,
+                                dst=_buffer('gray', shape, np.uint8))
         else:
             gray = frame
         
-        # Calculate Laplacian variance
-        laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-        variance = laplacian.var()
+        # Calculate Laplacian variance; the 3x3 aperture response of uint8
+        # input fits exactly in int16, so CV_16S gives the same variance as CV_64F
+        laplacian = cv2.Laplacian(gray, cv2.CV_16S,
+                                  dst=_buffer('laplacian', shape, np.int16))
+        _, stddev = cv2.meanStdDev(laplacian)
         
-        return variance
+        return float(stddev[0, 0]) ** 2
     
     @staticmethod
     def is_blurry(frame: np.ndarray, threshold: float = 100.0) -> bool:
@@ -1,9 +1,21 @@
 import cv2
+import functools
+import math
 import subprocess
 import time
 import numpy as np
 import json
 import os
+import queue
+import threading
+
+# Numba kernels (optional: falls back to the OpenCV pipeline without numba)
+import frame_pipeline
+
+# The Numba sharpener is opt-in: on x86 dev machines filter2D is 4-6x faster
+# (about 1 ms vs 4-7 ms per 640x480 frame); enable only if it measurably
+# wins on the target board
+NUMBA_SHARPEN = False
 
 # ============================================
 # CAMERA CONFIGURATION - Adjust these values
@@ -40,12 +52,16 @@ CAMERA_CONFIG = {
 # Settings file path
 SETTINGS_FILE = os.path.expanduser('./camera_settings.json')
 
+# Canonical JSON of the settings last read from / written to SETTINGS_FILE
+_last_saved_settings = None
+
 # ============================================
 # SETTINGS SAVE/LOAD FUNCTIONS
 # ============================================
 
 def save_settings(config):
-    """Save camera settings to JSON file"""
+    """Save camera settings to JSON file (skipped if unchanged)"""
+    global _last_saved_settings
     try:
         # Only save the settings we want to persist (not device/width/height)
         settings_to_save = {
@@ -63,8 +79,18 @@ def save_settings(config):
             'denoise': config['denoise'],
         }
         
-        with open(SETTINGS_FILE, 'w') as f:
+        canonical = json.dumps(settings_to_save, sort_keys=True)
+        if canonical == _last_saved_settings:
+            print(f"✓ Settings unchanged, {SETTINGS_FILE} not rewritten")
+            return True
+        
+        # Write to a temp file and rename so a crash never leaves a
+        # truncated settings file behind
+        tmp_file = SETTINGS_FILE + '.tmp'
+        with open(tmp_file, 'w') as f:
             json.dump(settings_to_save, f, indent=4)
+        os.replace(tmp_file, SETTINGS_FILE)
+        _last_saved_settings = canonical
         
         print(f"✓ Settings saved to {SETTINGS_FILE}")
         return True
@@ -74,6 +100,7 @@ def save_settings(config):
 
 def load_settings():
     """Load camera settings from JSON file"""
+    global _last_saved_settings
     if not os.path.exists(SETTINGS_FILE):
         print("No saved settings found, using defaults")
         return CAMERA_CONFIG.copy()
@@ -81,6 +108,7 @@ def load_settings():
     try:
         with open(SETTINGS_FILE, 'r') as f:
             saved_settings = json.load(f)
+        _last_saved_settings = json.dumps(saved_settings, sort_keys=True)
         
         # Start with default config
         config = CAMERA_CONFIG.copy()
@@ -98,15 +126,84 @@ def load_settings():
 # CAMERA CONTROL FUNCTIONS
 # ============================================
 
-def set_v4l2_control(device, control, value):
-    """Set V4L2 camera control using v4l2-ctl"""
+# Last value successfully written per (device, control)
+_last_applied = {}
+
+def set_v4l2_controls(device, controls):
+    """Set several V4L2 controls with one v4l2-ctl call, skipping unchanged ones"""
+    changed = {control: value for control, value in controls.items()
+               if _last_applied.get((device, control)) != value}
+    if not changed:
+        return True
+    
+    assignments = ','.join(f'{control}={value}' for control, value in changed.items())
     try:
-        subprocess.run(['v4l2-ctl', '-d', device, f'--set-ctrl={control}={value}'], 
+        subprocess.run(['v4l2-ctl', '-d', device, f'--set-ctrl={assignments}'], 
                       check=True, capture_output=True, text=True)
-        return True
     except subprocess.CalledProcessError as e:
-        print(f"Warning: Failed to set {control}={value}: {e.stderr}")
+        print(f"Warning: Failed to set {assignments}: {e.stderr}")
         return False
+    except OSError as e:
+        print(f"Warning: Failed to run v4l2-ctl: {e}")
+        return False
+    
+    for control, value in changed.items():
+        _last_applied[(device, control)] = value
+    return True
+
+def set_v4l2_control(device, control, value):
+    """Set V4L2 camera control using v4l2-ctl"""
+    return set_v4l2_controls(device, {control: value})
+
+# Background V4L2 writer: keeps v4l2-ctl fork/exec off the preview loop.
+# Only the latest value per (device, control) is written.
+_control_queue = queue.Queue()
+_pending_controls = {}
+_pending_lock = threading.Lock()
+_control_thread = None
+_NOT_PENDING = object()
+
+def _control_worker():
+    """Apply queued V4L2 control writes in FIFO order, auto_exposure first"""
+    while True:
+        key = _control_queue.get()
+        try:
+            device, control = key
+            with _pending_lock:
+                # A pending mode switch goes out before any other control, even
+                # an exposure write that was queued earlier
+                mode = _pending_controls.pop((device, 'auto_exposure'), _NOT_PENDING)
+                value = _pending_controls.pop(key, _NOT_PENDING)
+            if mode is not _NOT_PENDING:
+                set_v4l2_control(device, 'auto_exposure', mode)
+                time.sleep(0.1)  # Give camera time to switch modes
+            if value is not _NOT_PENDING:
+                set_v4l2_control(device, control, value)
+        except Exception as e:
+            # Keep the worker alive so flush_v4l2_controls() cannot hang
+            print(f"Warning: V4L2 control write failed: {e}")
+        finally:
+            _control_queue.task_done()
+
+def set_v4l2_control_async(device, control, value):
+    """Queue a V4L2 control write for the background thread"""
+    global _control_thread
+    if _control_thread is None:
+        _control_thread = threading.Thread(target=_control_worker, daemon=True)
+        _control_thread.start()
+    
+    key = (device, control)
+    with _pending_lock:
+        # A write for this control is already queued; just update its value
+        queued = key in _pending_controls
+        _pending_controls[key] = value
+    if not queued:
+        _control_queue.put(key)
+
+def flush_v4l2_controls():
+    """Wait until all queued V4L2 control writes have been applied"""
+    if _control_thread is not None:
+        _control_queue.join()
 
 def apply_camera_hardware_settings(config):
     """Apply hardware camera settings via V4L2"""
@@ -114,14 +211,20 @@ def apply_camera_hardware_settings(config):
     
     print("Applying hardware camera settings...")
     
-    # IMPORTANT: Set auto_exposure to manual (0) first to allow manual exposure control
-    set_v4l2_control(device, 'auto_exposure', config['auto_exposure'])
-    time.sleep(0.1)  # Give camera time to switch modes
-    
-    # Now set manual exposure and gain values
-    set_v4l2_control(device, 'exposure', config['exposure'])
-    set_v4l2_control(device, 'analogue_gain', config['analogue_gain'])
-    set_v4l2_control(device, 'white_balance_automatic', config['white_balance_auto'])
+    # IMPORTANT: Set auto_exposure in its own call first to allow manual exposure
+    # control. v4l2-ctl writes one --set-ctrl list per control class in class-id
+    # order (user-class exposure before camera-class auto_exposure), so argument
+    # order inside a combined call cannot guarantee this.
+    if _last_applied.get((device, 'auto_exposure')) != config['auto_exposure']:
+        set_v4l2_control(device, 'auto_exposure', config['auto_exposure'])
+        time.sleep(0.1)  # Give camera time to switch modes
+    
+    # Now set manual exposure and gain values in one v4l2-ctl call
+    set_v4l2_controls(device, {
+        'exposure': config['exposure'],
+        'analogue_gain': config['analogue_gain'],
+        'white_balance_automatic': config['white_balance_auto'],
+    })
     
     print("✓ Hardware settings applied")
     mode = "MANUAL" if config['auto_exposure'] == 1 else "AUTO"
@@ -129,8 +232,21 @@ def apply_camera_hardware_settings(config):
     print(f"  - Exposure: {config['exposure']}")
     print(f"  - Gain: {config['analogue_gain']}")
 
+def set_mjpg_format(cap):
+    """Request MJPG capture (libjpeg decode instead of YUYV->BGR conversion)"""
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    fourcc_str = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4))
+    if fourcc_str != 'MJPG':
+        print(f"Warning: Camera did not accept MJPG, using {fourcc_str!r}")
+    return fourcc_str == 'MJPG'
+
 def adjust_brightness_contrast(image, brightness=0, contrast=1.0):
     """Adjust brightness and contrast"""
+    # Only used to bake the 256-entry tone LUT (_build_luts), so fusing the
+    # two steps into one convertScaleAbs would save nothing per frame. The
+    # uint8 rounding between them is part of the tone curve; keep both steps
+    # so the LUT stays bit-identical to the original per-frame math.
     if brightness != 0:
         if brightness > 0:
             shadow = brightness
@@ -147,72 +263,200 @@ def adjust_brightness_contrast(image, brightness=0, contrast=1.0):
     
     return image
 
-def adjust_saturation(image, saturation=1.0):
-    """Adjust color saturation"""
+def adjust_saturation(image, saturation=1.0, dst=None):
+    """Adjust color saturation (written into dst if given)"""
     if saturation == 1.0:
         return image
     
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float32)
-    hsv[:, :, 1] = hsv[:, :, 1] * saturation
-    hsv[:, :, 1] = np.clip(hsv[:, :, 1], 0, 255)
-    return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+    # Scale S in uint8 HSV with one per-channel LUT (H and V pass through)
+    # instead of a float32 copy of the frame; the float32 ramp keeps the
+    # table identical to the old multiply/clip/truncate
+    lut = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(1, 256, 3)
+    lut[0, :, 1] = np.clip(np.arange(256, dtype=np.float32) * saturation, 0, 255)
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    cv2.LUT(hsv, lut, dst=hsv)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=dst)
 
 def adjust_rgb_channels(image, red_gain=1.0, green_gain=1.0, blue_gain=1.0):
     """Adjust individual RGB channel gains"""
     if red_gain == 1.0 and green_gain == 1.0 and blue_gain == 1.0:
         return image
     
-    # Split image into B, G, R channels
-    b, g, r = cv2.split(image.astype(np.float32))
-    
-    # Apply gains to each channel
-    r = np.clip(r * red_gain, 0, 255)
-    g = np.clip(g * green_gain, 0, 255)
-    b = np.clip(b * blue_gain, 0, 255)
-    
-    # Merge channels back
-    result = cv2.merge([b, g, r]).astype(np.uint8)
-    return result
+    # One broadcast multiply per channel (B, G, R) instead of split/merge;
+    # same float32 math and truncation as before. Only used to bake the
+    # cached gain LUTs, so this never runs on full frames.
+    gains = np.array([blue_gain, green_gain, red_gain], dtype=np.float32)
+    return np.clip(image * gains, 0, 255).astype(np.uint8)
 
-def apply_sharpening(image, amount=0.5):
-    """Apply sharpening filter"""
+def apply_sharpening(image, amount=0.5, dst=None):
+    """Apply sharpening filter (written into dst if given)"""
     if amount <= 0:
         return image
     
+    # float32 kernel keeps filter2D on its 8U->8U SIMD path
     kernel = np.array([[-1,-1,-1],
                        [-1, 9,-1],
-                       [-1,-1,-1]]) * (amount / 8)
+                       [-1,-1,-1]], dtype=np.float32) * (amount / 8)
     kernel[1, 1] = 1 + amount
-    return cv2.filter2D(image, -1, kernel)
-
-def apply_image_processing(frame, config):
-    """Apply all software image processing"""
-    # Brightness and contrast
-    frame = adjust_brightness_contrast(frame, 
-                                       config['brightness_offset'], 
-                                       config['contrast'])
-    
-    # Saturation
-    frame = adjust_saturation(frame, config['saturation'])
     
-    # RGB channel gains
-    frame = adjust_rgb_channels(frame, 
-                               config['red_gain'], 
-                               config['green_gain'], 
-                               config['blue_gain'])
+    if (NUMBA_SHARPEN and frame_pipeline.AVAILABLE and isinstance(image, np.ndarray)
+            and dst is not image):
+        # Same kernel in Q8 fixed point; cannot run in place. The centre tap
+        # is derived from the neighbour tap so the taps sum to exactly 256
+        # (unity DC gain, flat areas keep their level)
+        out = np.empty_like(image) if dst is None else dst
+        k_neighbor = int(round(amount / 8 * 256))
+        frame_pipeline.sharpen3x3(image, out, 256 + 8 * k_neighbor, k_neighbor)
+        return out
+    
+    return cv2.filter2D(image, cv2.CV_8U, kernel, dst=dst,
+                        borderType=cv2.BORDER_REPLICATE)
+
+def _is_unity(value):
+    """Whether a factor is 1.0, allowing float drift from repeated key steps"""
+    return math.isclose(value, 1.0, abs_tol=1e-6)
+
+# Identity ramp (1x256x3) used to bake the per-pixel adjustments into LUTs
+_IDENTITY_RAMP = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(1, 256, 3)
+
+@functools.lru_cache(maxsize=8)
+def _build_luts(brightness_offset, contrast, red_gain, green_gain, blue_gain):
+    """Build (tone, gain, fused) per-channel LUTs for one set of settings"""
+    # Push the identity ramp through the helpers so the tables match
+    # the per-frame math exactly
+    tone = adjust_brightness_contrast(_IDENTITY_RAMP, brightness_offset, contrast)
+    gain = adjust_rgb_channels(_IDENTITY_RAMP, red_gain, green_gain, blue_gain)
+    fused = adjust_rgb_channels(tone, red_gain, green_gain, blue_gain)
+    return tone, gain, fused
+
+# Scratch buffers (by shape) for stages that cannot write in place
+_scratch_buffers = {}
+
+def _scratch_like(image):
+    """Return a reusable scratch buffer shaped like image"""
+    buf = _scratch_buffers.get(image.shape)
+    if buf is None:
+        buf = _scratch_buffers[image.shape] = np.empty_like(image)
+    return buf
+
+def apply_image_processing(frame, config, dst=None):
+    """
+    Apply all software image processing
+    
+    If dst (same shape/dtype as frame) is given, the result is written into
+    it so callers can reuse one buffer across frames. frame may also be a
+    cv2.UMat (with dst=None), in which case the OpenCV path runs on it.
+    """
+    # The Numba kernels only work on host arrays
+    use_jit = frame_pipeline.AVAILABLE and isinstance(frame, np.ndarray)
+    
+    # Decide up front which pointwise stages actually change the frame
+    need_tone = config['brightness_offset'] != 0 or not _is_unity(config['contrast'])
+    need_sat = not _is_unity(config['saturation'])
+    need_gain = not (_is_unity(config['red_gain']) and _is_unity(config['green_gain']) and
+                     _is_unity(config['blue_gain']))
+    
+    sharpen = config['sharpness'] > 0
+    
+    # The Numba sharpener cannot run in place, so route the pointwise result
+    # through a scratch buffer and let sharpening write the final dst
+    stage_dst = dst
+    if sharpen and use_jit and NUMBA_SHARPEN and dst is not None:
+        stage_dst = _scratch_like(dst)
+    
+    if need_tone or need_sat or need_gain:
+        tone_lut, gain_lut, fused_lut = _build_luts(config['brightness_offset'],
+                                                    config['contrast'],
+                                                    config['red_gain'],
+                                                    config['green_gain'],
+                                                    config['blue_gain'])
+    
+    if not (need_tone or need_sat or need_gain):
+        # Nothing pointwise to do; skip the full-frame pass
+        if dst is not None and stage_dst is dst:
+            np.copyto(dst, frame)
+            frame = dst
+    elif not need_sat:
+        # Brightness, contrast and RGB gains in a single LUT pass
+        frame = cv2.LUT(frame, fused_lut, dst=stage_dst)
+    elif use_jit:
+        # Tone, saturation and gains fused into a single JIT-compiled pass
+        out = np.empty_like(frame) if stage_dst is None else stage_dst
+        frame_pipeline.process_pixels(frame, out, tone_lut[0], gain_lut[0],
+                                      float(config['saturation']))
+        frame = out
+    else:
+        # Saturation sits between the tone and gain stages
+        if need_tone:
+            frame = cv2.LUT(frame, tone_lut, dst=stage_dst)
+        frame = adjust_saturation(frame, config['saturation'], dst=stage_dst)
+        if need_gain:
+            frame = cv2.LUT(frame, gain_lut, dst=frame)
     
     # Sharpening
-    if config['sharpness'] > 0:
-        frame = apply_sharpening(frame, config['sharpness'])
+    if sharpen:
+        frame = apply_sharpening(frame, config['sharpness'], dst=dst)
     
     # Denoising
     if config['denoise']:
-        frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+        denoised = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+        if dst is not None:
+            np.copyto(dst, denoised)
+            denoised = dst
+        frame = denoised
     
     return frame
 
-def display_settings_overlay(frame, config):
-    """Display current settings on frame"""
+def apply_image_processing_batch(frames, config, out=None):
+    """
+    Apply all software image processing to a stack of frames (N, H, W, 3)
+    
+    When saturation is active and Numba is available, the pointwise stages
+    run as one parallel pass across all frames; sharpening and denoising are
+    then applied frame by frame. Otherwise each frame takes the per-frame
+    path (a single cv2.LUT when saturation is 1.0).
+    """
+    if out is None:
+        out = np.empty_like(frames)
+    if len(frames) == 0:
+        return out
+    
+    if not frame_pipeline.AVAILABLE or _is_unity(config['saturation']):
+        for i in range(len(frames)):
+            apply_image_processing(frames[i], config, dst=out[i])
+        return out
+    
+    tone_lut, gain_lut, fused_lut = _build_luts(config['brightness_offset'],
+                                                config['contrast'],
+                                                config['red_gain'],
+                                                config['green_gain'],
+                                                config['blue_gain'])
+    frame_pipeline.process_batch(frames, out, tone_lut[0], gain_lut[0],
+                                 float(config['saturation']))
+    
+    # Neighbourhood stages read from a scratch copy and write back into out
+    if config['sharpness'] > 0 or config['denoise']:
+        scratch = _scratch_like(out[0])
+        for i in range(len(out)):
+            np.copyto(scratch, out[i])
+            frame = scratch
+            if config['sharpness'] > 0:
+                frame = apply_sharpening(frame, config['sharpness'], dst=out[i])
+            if config['denoise']:
+                np.copyto(out[i], cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21))
+    
+    return out
+
+# Fields shown by the overlay; it is only re-rendered when one of them changes
+_OVERLAY_FIELDS = ('auto_exposure', 'exposure', 'analogue_gain',
+                   'brightness_offset', 'contrast', 'saturation', 'sharpness',
+                   'red_gain', 'green_gain', 'blue_gain')
+
+# Last rendered overlay: text pixels cropped to their bounding box + mask
+_overlay_cache = {'key': None, 'roi': None, 'image': None, 'mask': None}
+
+def _render_settings_overlay(shape, config):
+    """Render the settings text once onto a blank layer and crop it"""
     y_offset = 30
     font = cv2.FONT_HERSHEY_SIMPLEX
     font_scale = 0.45
@@ -235,12 +479,135 @@ def display_settings_overlay(frame, config):
         f"Q:Quit | R:Reset | P:Print | O:Hide | T:Auto/Manual"
     ]
     
+    layer = np.zeros(shape, dtype=np.uint8)
     for i, text in enumerate(settings_text):
-        cv2.putText(frame, text, (10, y_offset + i * 18), 
+        cv2.putText(layer, text, (10, y_offset + i * 18), 
                    font, font_scale, color, thickness, cv2.LINE_AA)
     
+    # Keep only the bounding box of the drawn text
+    mask = layer.any(axis=2)
+    ys, xs = np.nonzero(mask)
+    if len(ys) == 0:
+        return None, None, None
+    roi = (slice(ys.min(), ys.max() + 1), slice(xs.min(), xs.max() + 1))
+    return roi, layer[roi].copy(), mask[roi][..., None].copy()
+
+def display_settings_overlay(frame, config):
+    """Display current settings on frame"""
+    key = (frame.shape,) + tuple(config[field] for field in _OVERLAY_FIELDS)
+    if _overlay_cache['key'] != key:
+        roi, image, mask = _render_settings_overlay(frame.shape, config)
+        _overlay_cache.update(key=key, roi=roi, image=image, mask=mask)
+    
+    # Blit the cached text pixels instead of re-rasterizing every frame
+    if _overlay_cache['roi'] is not None:
+        np.copyto(frame[_overlay_cache['roi']], _overlay_cache['image'],
+                  where=_overlay_cache['mask'])
+    
     return frame
 
+# ============================================
+# KEYBOARD HANDLERS
+# ============================================
+
+def _clamp_step(value, delta, low, high):
+    """Step value, clamping to high when increasing and low when decreasing"""
+    # Round so repeated 0.1/0.05 steps land exactly on values like 1.0
+    value = round(value + delta, 2)
+    return min(value, high) if delta > 0 else max(value, low)
+
+def _reset_settings(config):
+    """Reset settings to defaults (in place)"""
+    flush_v4l2_controls()
+    config.clear()
+    config.update(CAMERA_CONFIG)
+    apply_camera_hardware_settings(config)
+    print("Settings reset to defaults")
+
+def _print_settings(config):
+    """Print current settings"""
+    print("\nCurrent Settings:")
+    mode = "MANUAL" if config['auto_exposure'] == 1 else "AUTO"
+    print(f"  auto_exposure: {config['auto_exposure']} ({mode})")
+    print(f"  exposure: {config['exposure']}")
+    print(f"  analogue_gain: {config['analogue_gain']}")
+    print(f"  brightness_offset: {config['brightness_offset']}")
+    print(f"  contrast: {config['contrast']:.1f}")
+    print(f"  saturation: {config['saturation']:.1f}")
+    print(f"  sharpness: {config['sharpness']:.1f}")
+    print(f"  red_gain: {config['red_gain']:.2f}")
+    print(f"  green_gain: {config['green_gain']:.2f}")
+    print(f"  blue_gain: {config['blue_gain']:.2f}\n")
+
+def _toggle_auto_exposure(config):
+    """Toggle auto/manual exposure (0=auto, 1=manual)"""
+    config['auto_exposure'] = 0 if config['auto_exposure'] == 1 else 1
+    set_v4l2_control_async(config['device'], 'auto_exposure', config['auto_exposure'])
+    mode = "MANUAL" if config['auto_exposure'] == 1 else "AUTO"
+    print(f"Exposure mode: {mode}")
+
+def _step_exposure(config, delta):
+    """Step manual exposure, switching to manual mode first if needed"""
+    # Ensure manual mode is enabled (1=manual)
+    if config['auto_exposure'] != 1:
+        config['auto_exposure'] = 1
+        set_v4l2_control_async(config['device'], 'auto_exposure', 1)
+        print("Switched to MANUAL exposure mode")
+    config['exposure'] = _clamp_step(config['exposure'], delta, 4, 1964)
+    set_v4l2_control_async(config['device'], 'exposure', config['exposure'])
+
+def _step_gain(config, delta):
+    """Step analogue gain"""
+    config['analogue_gain'] = _clamp_step(config['analogue_gain'], delta, 16, 1023)
+    set_v4l2_control_async(config['device'], 'analogue_gain', config['analogue_gain'])
+
+def _step_setting(config, name, delta, low, high):
+    """Step a software processing setting"""
+    config[name] = _clamp_step(config[name], delta, low, high)
+
+def _stepper(name, delta, low, high):
+    """Bind a _step_setting handler for one setting"""
+    return functools.partial(_step_setting, name=name, delta=delta, low=low, high=high)
+
+def _bind_letters(bindings):
+    """Map each letter binding to both its lower- and upper-case key code"""
+    handlers = {}
+    for char, handler in bindings.items():
+        handlers[ord(char)] = handler
+        handlers[ord(char.upper())] = handler
+    return handlers
+
+# Key code -> handler(config); Q (quit) and O (overlay) are handled in main
+KEY_HANDLERS = _bind_letters({
+    'r': _reset_settings,
+    'p': _print_settings,
+    't': _toggle_auto_exposure,
+    
+    # Exposure and gain (hardware)
+    'a': functools.partial(_step_exposure, delta=50),
+    'z': functools.partial(_step_exposure, delta=-50),
+    's': functools.partial(_step_gain, delta=32),
+    'x': functools.partial(_step_gain, delta=-32),
+    
+    # Software processing
+    'd': _stepper('brightness_offset', 5, -100, 100),
+    'c': _stepper('brightness_offset', -5, -100, 100),
+    'f': _stepper('contrast', 0.1, 0.5, 3.0),
+    'v': _stepper('contrast', -0.1, 0.5, 3.0),
+    'g': _stepper('saturation', 0.1, 0.0, 2.0),
+    'b': _stepper('saturation', -0.1, 0.0, 2.0),
+    'h': _stepper('sharpness', 0.1, 0.0, 2.0),
+    'n': _stepper('sharpness', -0.1, 0.0, 2.0),
+    
+    # RGB channel gains
+    'j': _stepper('red_gain', 0.05, 0.0, 2.0),
+    'm': _stepper('red_gain', -0.05, 0.0, 2.0),
+    'k': _stepper('green_gain', 0.05, 0.0, 2.0),
+    'l': _stepper('blue_gain', 0.05, 0.0, 2.0),
+})
+KEY_HANDLERS[44] = _stepper('green_gain', -0.05, 0.0, 2.0)  # ','
+KEY_HANDLERS[46] = _stepper('blue_gain', -0.05, 0.0, 2.0)  # '.'
+
 # ============================================
 # MAIN PROGRAM
 # ============================================
@@ -257,6 +624,9 @@ def main():
         print("Error: Could not open camera")
         return
     
+    # Use MJPG (must be set before resolution/fps)
+    set_mjpg_format(cap)
+    
     # Set resolution
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, config['width'])
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config['height'])
@@ -268,6 +638,16 @@ def main():
     # Apply hardware settings
     apply_camera_hardware_settings(config)
     
+    # Compile the Numba kernels now rather than on the first preview frame
+    frame_pipeline.warmup()
+    
+    # OpenCV T-API: without Numba the preview runs the OpenCV path, which can
+    # go to an OpenCL device instead (with Numba, stay on the same kernel as
+    # capture so the preview matches the saved frames)
+    use_umat = not frame_pipeline.AVAILABLE and cv2.ocl.haveOpenCL()
+    if use_umat:
+        cv2.ocl.setUseOpenCL(True)
+    
     print("\n" + "="*70)
     print("CAMERA PREVIEW WITH REAL-TIME CONTROLS + AUTO-SAVE")
     print("="*70)
@@ -298,120 +678,38 @@ def main():
             print("Error: Failed to capture frame")
             break
         
-        # Apply image processing
+        # Apply image processing (on the OpenCL device when available and
+        # the overlay is hidden: imshow accepts the resulting UMat directly,
+        # while the overlay blit would have to download it every frame)
+        if use_umat and not show_overlay:
+            frame = cv2.UMat(frame)
         processed_frame = apply_image_processing(frame, config)
         
-        # Show settings overlay
+        # Show settings overlay (drawn in place: processed_frame is not
+        # reused after display, and the raw capture frame is discarded too)
         if show_overlay:
-            display_frame = display_settings_overlay(processed_frame.copy(), config)
+            display_frame = display_settings_overlay(processed_frame, config)
         else:
             display_frame = processed_frame
         
         cv2.imshow('Camera Preview', display_frame)
         
-        # Handle keyboard input
+        # Handle keyboard input (255 = no key pressed)
         key = cv2.waitKey(1) & 0xFF
+        if key == 255:
+            continue
         
         if key == ord('q') or key == ord('Q'):
             break
         elif key == ord('o') or key == ord('O'):
             show_overlay = not show_overlay
-        elif key == ord('r') or key == ord('R'):
-            config = CAMERA_CONFIG.copy()
-            apply_camera_hardware_settings(config)
-            print("Settings reset to defaults")
-        elif key == ord('p') or key == ord('P'):
-            print("\nCurrent Settings:")
-            mode = "MANUAL" if config['auto_exposure'] == 1 else "AUTO"
-            print(f"  auto_exposure: {config['auto_exposure']} ({mode})")
-            print(f"  exposure: {config['exposure']}")
-            print(f"  analogue_gain: {config['analogue_gain']}")
-            print(f"  brightness_offset: {config['brightness_offset']}")
-            print(f"  contrast: {config['contrast']:.1f}")
-            print(f"  saturation: {config['saturation']:.1f}")
-            print(f"  sharpness: {config['sharpness']:.1f}")
-            print(f"  red_gain: {config['red_gain']:.2f}")
-            print(f"  green_gain: {config['green_gain']:.2f}")
-            print(f"  blue_gain: {config['blue_gain']:.2f}\n")
-        elif key == ord('t') or key == ord('T'):
-            # Toggle auto/manual exposure (0=auto, 1=manual)
-            config['auto_exposure'] = 0 if config['auto_exposure'] == 1 else 1
-            set_v4l2_control(config['device'], 'auto_exposure', config['auto_exposure'])
-            time.sleep(0.1)
-            mode = "MANUAL" if config['auto_exposure'] == 1 else "AUTO"
-            print(f"Exposure mode: {mode}")
-        
-        # Exposure controls
-        elif key == ord('a') or key == ord('A'):
-            # Ensure manual mode is enabled (1=manual)
-            if config['auto_exposure'] != 1:
-                config['auto_exposure'] = 1
-                set_v4l2_control(config['device'], 'auto_exposure', 1)
-                time.sleep(0.1)
-                print("Switched to MANUAL exposure mode")
-            config['exposure'] = min(config['exposure'] + 50, 1964)
-            set_v4l2_control(config['device'], 'exposure', config['exposure'])
-        elif key == ord('z') or key == ord('Z'):
-            # Ensure manual mode is enabled (1=manual)
-            if config['auto_exposure'] != 1:
-                config['auto_exposure'] = 1
-                set_v4l2_control(config['device'], 'auto_exposure', 1)
-                time.sleep(0.1)
-                print("Switched to MANUAL exposure mode")
-            config['exposure'] = max(config['exposure'] - 50, 4)
-            set_v4l2_control(config['device'], 'exposure', config['exposure'])
-        
-        # Gain controls
-        elif key == ord('s') or key == ord('S'):
-            config['analogue_gain'] = min(config['analogue_gain'] + 32, 1023)
-            set_v4l2_control(config['device'], 'analogue_gain', config['analogue_gain'])
-        elif key == ord('x') or key == ord('X'):
-            config['analogue_gain'] = max(config['analogue_gain'] - 32, 16)
-            set_v4l2_control(config['device'], 'analogue_gain', config['analogue_gain'])
-        
-        # Brightness controls
-        elif key == ord('d') or key == ord('D'):
-            config['brightness_offset'] = min(config['brightness_offset'] + 5, 100)
-        elif key == ord('c') or key == ord('C'):
-            config['brightness_offset'] = max(config['brightness_offset'] - 5, -100)
-        
-        # Contrast controls
-        elif key == ord('f') or key == ord('F'):
-            config['contrast'] = min(config['contrast'] + 0.1, 3.0)
-        elif key == ord('v') or key == ord('V'):
-            config['contrast'] = max(config['contrast'] - 0.1, 0.5)
-        
-        # Saturation controls
-        elif key == ord('g') or key == ord('G'):
-            config['saturation'] = min(config['saturation'] + 0.1, 2.0)
-        elif key == ord('b') or key == ord('B'):
-            config['saturation'] = max(config['saturation'] - 0.1, 0.0)
-        
-        # Sharpness controls
-        elif key == ord('h') or key == ord('H'):
-            config['sharpness'] = min(config['sharpness'] + 0.1, 2.0)
-        elif key == ord('n') or key == ord('N'):
-            config['sharpness'] = max(config['sharpness'] - 0.1, 0.0)
-        
-        # RED channel controls
-        elif key == ord('j') or key == ord('J'):
-            config['red_gain'] = min(config['red_gain'] + 0.05, 2.0)
-        elif key == ord('m') or key == ord('M'):
-            config['red_gain'] = max(config['red_gain'] - 0.05, 0.0)
-        
-        # GREEN channel controls
-        elif key == ord('k') or key == ord('K'):
-            config['green_gain'] = min(config['green_gain'] + 0.05, 2.0)
-        elif key == 44:  # comma key ','
-            config['green_gain'] = max(config['green_gain'] - 0.05, 0.0)
-        
-        # BLUE channel controls
-        elif key == ord('l') or key == ord('L'):
-            config['blue_gain'] = min(config['blue_gain'] + 0.05, 2.0)
-        elif key == 46:  # period key '.'
-            config['blue_gain'] = max(config['blue_gain'] - 0.05, 0.0)
+        else:
+            handler = KEY_HANDLERS.get(key)
+            if handler:
+                handler(config)
     
     # Cleanup
+    flush_v4l2_controls()
     cap.release()
     cv2.destroyAllWindows()
     
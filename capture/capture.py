@@ -6,10 +6,12 @@
 """
 
 import cv2
+import numpy as np
 import time
 import os
 import sys
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
@@ -21,8 +23,11 @@ from camera_tune import (
     load_settings,
     set_v4l2_control,
     apply_camera_hardware_settings,
-    apply_image_processing
+    set_mjpg_format,
+    apply_image_processing,
+    apply_image_processing_batch
 )
+import frame_pipeline
 
 
 # ============================================
@@ -36,10 +41,18 @@ TOTAL_FRAMES = CAPTURE_DURATION * CAPTURE_FPS  # 总帧数 = 30
 BASE_DIR = Path(__file__).parent.parent
 BUFFER_DIR = BASE_DIR / 'buffer'
 
+# JPEG编码线程数（cv2.imwrite会释放GIL）
+SAVE_WORKERS = os.cpu_count() or 4
+
 
 # ============================================
 # 帧捕获函数
 # ============================================
+def save_frame(filepath, frame):
+    """以高质量参数保存单帧图像 (JPEG质量95)"""
+    return cv2.imwrite(str(filepath), frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+
 def capture_frames():
     """
     捕获视频帧并保存到buffer目录
@@ -87,7 +100,8 @@ def capture_frames():
         print("错误: 无法打开相机")
         return False
     
-    # 设置相机参数
+    # 设置相机参数（MJPG需在分辨率之前设置）
+    set_mjpg_format(cap)
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
     cap.set(cv2.CAP_PROP_FPS, camera_fps)
@@ -101,12 +115,13 @@ def capture_frames():
     # 预热相机（读取几帧并丢弃，让相机稳定）
     print("\n正在预热相机...")
     for i in range(10):
-        ret, frame = cap.read()
-        if ret:
-            # 对预热帧也应用图像处理，让相机适应
-            _ = apply_image_processing(frame, config)
+        # 软件图像处理不影响相机ISP，预热时只需读取并丢弃
+        cap.read()
         time.sleep(0.05)
     
+    # 预先编译Numba内核，避免首帧在按时间节拍的捕获循环中卡顿
+    frame_pipeline.warmup()
+    
     print("✓ 相机已准备就绪\n")
     
     # 开始捕获
@@ -114,10 +129,16 @@ def capture_frames():
     print("提示: 捕获过程中会显示实时预览窗口")
     print("-"*70)
     
-    captured_frames = []
+    # 预分配缓冲区（首帧到达时按实际分辨率分配），循环中不再逐帧分配
+    # 捕获期间只保存原始帧，全分辨率图像处理在捕获结束后批量进行
+    raw_frames = None  # (TOTAL_FRAMES, H, W, 3) 原始帧
+    thumb_buf = None  # 半分辨率原始缩略图
+    display_buf = None  # 半分辨率预览缓冲区（仅用于显示）
     frame_interval = 1.0 / CAPTURE_FPS  # 每帧之间的时间间隔
     
-    start_time = time.time()
+    session_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    start_time = time.monotonic()
     frame_count = 0
     
     # 创建预览窗口
@@ -133,12 +154,20 @@ def capture_frames():
             print(f"错误: 无法读取帧 #{frame_count + 1}")
             break
         
-        # 应用图像处理
-        processed_frame = apply_image_processing(frame, config)
+        if raw_frames is None:
+            raw_frames = np.empty((TOTAL_FRAMES,) + frame.shape, dtype=np.uint8)
+            thumb_buf = np.empty((frame.shape[0] // 2, frame.shape[1] // 2, 3),
+                                 dtype=np.uint8)
+            display_buf = np.empty_like(thumb_buf)
+        
+        # 仅保存原始帧到预分配的帧槽
+        np.copyto(raw_frames[frame_count], frame)
         
-        # 在图像上添加信息文本
-        display_frame = processed_frame.copy()
-        timestamp = time.time() - start_time
+        # 预览只处理半分辨率缩略图
+        cv2.resize(frame, (thumb_buf.shape[1], thumb_buf.shape[0]),
+                   dst=thumb_buf, interpolation=cv2.INTER_NEAREST)
+        display_frame = apply_image_processing(thumb_buf, config, dst=display_buf)
+        timestamp = time.monotonic() - start_time
         
         # 添加捕获信息覆盖层
         text_lines = [
@@ -147,57 +176,57 @@ def capture_frames():
             f"帧率: {CAPTURE_FPS} fps"
         ]
         
-        y_offset = 30
+        # 在缩略图上绘制文本（坐标和字号按半分辨率缩放）
+        y_offset = 15
         for i, text in enumerate(text_lines):
-            cv2.putText(display_frame, text, (10, y_offset + i * 25),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2, cv2.LINE_AA)
+            cv2.putText(display_frame, text, (5, y_offset + i * 13),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.35, (0, 255, 0), 1, cv2.LINE_AA)
         
         # 显示预览
         cv2.imshow(window_name, display_frame)
         cv2.waitKey(1)  # 刷新显示
         
-        # 保存帧信息
-        captured_frames.append({
-            'frame': processed_frame,
-            'timestamp': timestamp,
-            'frame_number': frame_count
-        })
-        
         print(f"✓ 捕获帧 {frame_count + 1}/{TOTAL_FRAMES} (时间: {timestamp:.3f}s)")
         
         frame_count += 1
         
-        # 等待下一帧
+        # 等待到下一帧的截止时间（扣除本帧已用的处理时间，避免累积漂移）
         if frame_count < TOTAL_FRAMES:
-            time.sleep(frame_interval)
+            sleep_time = start_time + frame_count * frame_interval - time.monotonic()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
     
     # 释放相机和关闭窗口
     cap.release()
     cv2.destroyAllWindows()
     
     print("-"*70)
-    print(f"✓ 捕获完成! 共捕获 {len(captured_frames)} 帧")
+    print(f"✓ 捕获完成! 共捕获 {frame_count} 帧")
+    
+    if frame_count == 0:
+        return False
+    
+    # 批量处理所有捕获的帧（有Numba时按帧并行）
+    print(f"\n正在处理 {frame_count} 帧...")
+    processed_frames = apply_image_processing_batch(raw_frames[:frame_count], config)
     
-    # 保存帧到buffer目录
+    # 保存帧到buffer目录（多线程JPEG编码，cv2.imwrite会释放GIL）
     print(f"\n正在保存帧到 {BUFFER_DIR}...")
-    session_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filenames = [f"frame_{session_time}_{i:03d}.jpg" for i in range(frame_count)]
     
-    for i, frame_data in enumerate(captured_frames):
-        filename = f"frame_{session_time}_{i:03d}.jpg"
-        filepath = BUFFER_DIR / filename
-        
-        # 使用高质量参数保存图像 (JPEG质量95)
-        success = cv2.imwrite(str(filepath), frame_data['frame'], 
-                             [cv2.IMWRITE_JPEG_QUALITY, 95])
-        if success:
-            print(f"  ✓ 已保存: {filename}")
-        else:
-            print(f"  ✗ 保存失败: {filename}")
+    with ThreadPoolExecutor(max_workers=SAVE_WORKERS) as save_executor:
+        results = save_executor.map(
+            save_frame, (BUFFER_DIR / name for name in filenames), processed_frames)
+        for filename, success in zip(filenames, results):
+            if success:
+                print(f"  ✓ 已保存: {filename}")
+            else:
+                print(f"  ✗ 保存失败: {filename}")
     
     print("\n" + "="*70)
     print("捕获任务完成!")
     print(f"保存位置: {BUFFER_DIR}")
-    print(f"文件数量: {len(captured_frames)}")
+    print(f"文件数量: {frame_count}")
     print("="*70)
     
     return True
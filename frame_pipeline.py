@@ -0,0 +1,84 @@
+"""
+帧处理流水线的Numba内核 (camera_tune / capture / frame_selector 共用)
+把亮度对比度查找表、HSV饱和度和RGB增益查找表合并为一次逐像素遍历
+未安装numba时 AVAILABLE 为 False, 调用方应使用OpenCV实现
+"""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+AVAILABLE = numba is not None
+
+
+if numba is not None:
+    @numba.njit(fastmath=True, cache=True)
+    def _map_pixel(src, dst, y, x, tone_lut, gain_lut, saturation):
+        """单个像素: 亮度对比度查找表 -> HSV饱和度 -> RGB增益查找表"""
+        b = int(tone_lut[src[y, x, 0], 0])
+        g = int(tone_lut[src[y, x, 1], 1])
+        r = int(tone_lut[src[y, x, 2], 2])
+        hi = max(b, g, r)
+        lo = min(b, g, r)
+        if hi != lo:
+            # 按HSV模型缩放饱和度: 明度(最大值)和色相不变, 各通道到最大值的
+            # 距离按同一比例缩放; S' = S * saturation, 上限为1 (最小通道降到0)
+            scale = min(saturation, hi / (hi - lo))
+            b = int(hi - (hi - b) * scale + 0.5)
+            g = int(hi - (hi - g) * scale + 0.5)
+            r = int(hi - (hi - r) * scale + 0.5)
+        dst[y, x, 0] = gain_lut[b, 0]
+        dst[y, x, 1] = gain_lut[g, 1]
+        dst[y, x, 2] = gain_lut[r, 2]
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def process_pixels(src, dst, tone_lut, gain_lut, saturation):
+        """
+        亮度对比度 -> 饱和度 -> RGB增益, 逐行并行一次完成
+
+        tone_lut / gain_lut 为 (256, 3) uint8 按通道查找表 (B, G, R顺序)
+        """
+        height, width = src.shape[0], src.shape[1]
+        for y in numba.prange(height):
+            for x in range(width):
+                _map_pixel(src, dst, y, x, tone_lut, gain_lut, saturation)
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def process_batch(src, dst, tone_lut, gain_lut, saturation):
+        """对 (N, H, W, 3) 帧堆栈执行同样的逐像素处理, 按帧并行"""
+        count, height, width = src.shape[0], src.shape[1], src.shape[2]
+        for i in numba.prange(count):
+            for y in range(height):
+                for x in range(width):
+                    _map_pixel(src[i], dst[i], y, x, tone_lut, gain_lut, saturation)
+
+    @numba.njit(parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def sharpen3x3(src, dst, k_center, k_neighbor):
+        """Q8定点整数系数的3x3锐化, 边界复制 (不能原地执行)"""
+        height, width, channels = src.shape
+        for y in numba.prange(height):
+            y0 = max(y - 1, 0)
+            y2 = min(y + 1, height - 1)
+            for x in range(width):
+                x0 = max(x - 1, 0)
+                x2 = min(x + 1, width - 1)
+                for c in range(channels):
+                    ring = (np.int32(src[y0, x0, c]) + src[y0, x, c] + src[y0, x2, c] +
+                            src[y, x0, c] + src[y, x2, c] +
+                            src[y2, x0, c] + src[y2, x, c] + src[y2, x2, c])
+                    v = (k_center * np.int32(src[y, x, c]) - k_neighbor * ring + 128) >> 8
+                    dst[y, x, c] = min(max(v, 0), 255)
+
+
+def warmup():
+    """用小数组触发所有内核的编译, 避免第一帧承担编译开销"""
+    if numba is None:
+        return
+    lut = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(256, 3)
+    frames = np.zeros((1, 2, 2, 3), dtype=np.uint8)
+    process_pixels(frames[0], np.empty_like(frames[0]), lut, lut, 1.0)
+    process_batch(frames, np.empty_like(frames), lut, lut, 1.0)
+    sharpen3x3(frames[0], np.empty_like(frames[0]), 256, 0)
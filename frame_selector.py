@@ -5,6 +5,8 @@
 """
 
 import cv2
+import functools
+import math
 import subprocess
 import time
 import numpy as np
@@ -12,6 +14,7 @@ import json
 import os
 from blur_detector import BlurDetector
 from hand_detector import HandDetector
+import frame_pipeline
 
 # ============================================
 # 相机配置
@@ -41,6 +44,7 @@ FRAME_SELECTION_CONFIG = {
     'hand_confidence_threshold': 0.7,  # 手部检测置信度阈值
     'target_hand_state': 'EMPTY',  # 目标手部状态: 'EMPTY' 或 'HOLDING'
     'buffer_size': 30,  # 保留最近N帧用于比较
+    'overlay_refresh_interval': 3,  # 每N帧重新渲染一次信息叠加层
 }
 
 SETTINGS_FILE = './camera_settings.json'
@@ -69,15 +73,33 @@ def load_settings():
         return CAMERA_CONFIG.copy()
 
 
-def set_v4l2_control(device, control, value):
-    """使用v4l2-ctl设置相机控制参数"""
+# 每个 (设备, 控制项) 最近一次成功写入的值
+_last_applied = {}
+
+
+def set_v4l2_controls(device, controls):
+    """用一次v4l2-ctl调用设置多个相机控制参数，跳过未改变的项"""
+    changed = {control: value for control, value in controls.items()
+               if _last_applied.get((device, control)) != value}
+    if not changed:
+        return True
+    
+    assignments = ','.join(f'{control}={value}' for control, value in changed.items())
     try:
-        subprocess.run(['v4l2-ctl', '-d', device, f'--set-ctrl={control}={value}'], 
+        subprocess.run(['v4l2-ctl', '-d', device, f'--set-ctrl={assignments}'], 
                       check=True, capture_output=True, text=True)
-        return True
     except subprocess.CalledProcessError as e:
-        print(f"警告: 设置 {control}={value} 失败: {e.stderr}")
+        print(f"警告: 设置 {assignments} 失败: {e.stderr}")
         return False
+    
+    for control, value in changed.items():
+        _last_applied[(device, control)] = value
+    return True
+
+
+def set_v4l2_control(device, control, value):
+    """使用v4l2-ctl设置相机控制参数"""
+    return set_v4l2_controls(device, {control: value})
 
 
 def apply_camera_hardware_settings(config):
@@ -86,18 +108,37 @@ def apply_camera_hardware_settings(config):
     
     print("正在应用硬件相机设置...")
     
-    set_v4l2_control(device, 'auto_exposure', config['auto_exposure'])
-    time.sleep(0.1)
+    # auto_exposure必须单独先设置: v4l2-ctl按控制类别顺序写入
+    # (用户类的exposure先于相机类的auto_exposure), 参数顺序无法保证先切换模式
+    if _last_applied.get((device, 'auto_exposure')) != config['auto_exposure']:
+        set_v4l2_control(device, 'auto_exposure', config['auto_exposure'])
+        time.sleep(0.1)
     
-    set_v4l2_control(device, 'exposure', config['exposure'])
-    set_v4l2_control(device, 'analogue_gain', config['analogue_gain'])
-    set_v4l2_control(device, 'white_balance_automatic', config['white_balance_auto'])
+    # 其余控制项合并为一次v4l2-ctl调用
+    set_v4l2_controls(device, {
+        'exposure': config['exposure'],
+        'analogue_gain': config['analogue_gain'],
+        'white_balance_automatic': config['white_balance_auto'],
+    })
     
     print("✓ 硬件设置已应用")
 
 
+def set_mjpg_format(cap):
+    """请求MJPG格式（由libjpeg解码代替YUYV软件转换），驱动不支持时给出警告"""
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    fourcc_str = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4))
+    if fourcc_str != 'MJPG':
+        print(f"警告: 相机不支持MJPG, 使用 {fourcc_str!r}")
+    return fourcc_str == 'MJPG'
+
+
 def adjust_brightness_contrast(image, brightness=0, contrast=1.0):
     """调整亮度和对比度"""
+    # 只用于烘焙256项亮度对比度查找表 (_build_luts)，合并成一次convertScaleAbs
+    # 不会让任何一帧变快；两步之间的uint8取整属于色调曲线的一部分，保留两步
+    # 以保证查找表与原逐帧计算逐位一致（与camera_tune相同）
     if brightness != 0:
         if brightness > 0:
             shadow = brightness
@@ -115,15 +156,56 @@ def adjust_brightness_contrast(image, brightness=0, contrast=1.0):
     return image
 
 
-def adjust_saturation(image, saturation=1.0):
-    """调整色彩饱和度"""
-    if saturation == 1.0:
-        return image
+@functools.lru_cache(maxsize=8)
+def _saturation_lut(saturation):
+    """构建S通道的256项查找表"""
+    return np.clip(np.arange(256) * saturation, 0, 255).astype(np.uint8)
+
+
+class SaturationAdjuster:
+    """复用HSV/BGR缓冲区的饱和度调整器，避免逐帧分配"""
+    
+    def __init__(self):
+        self._hsv = None
+        self._out = None
     
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV).astype(np.float32)
-    hsv[:, :, 1] = hsv[:, :, 1] * saturation
-    hsv[:, :, 1] = np.clip(hsv[:, :, 1], 0, 255)
-    return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+    def __call__(self, image, saturation=1.0):
+        """
+        调整色彩饱和度
+        
+        返回的数组为内部缓冲区，下次调用时会被覆盖
+        """
+        if saturation == 1.0:
+            return image
+        
+        if self._hsv is None or self._hsv.shape != image.shape:
+            self._hsv = np.empty_like(image)
+            self._out = np.empty_like(image)
+        
+        # 在uint8上通过查找表原地缩放S通道；mode='clip'时np.take直接写入out
+        # （默认'raise'会先写入临时数组），uint8索引不会越界
+        cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=self._hsv)
+        s_channel = self._hsv[:, :, 1]
+        np.take(_saturation_lut(saturation), s_channel, out=s_channel, mode='clip')
+        return cv2.cvtColor(self._hsv, cv2.COLOR_HSV2BGR, dst=self._out)
+
+
+_saturation_adjuster = SaturationAdjuster()
+
+
+def adjust_saturation(image, saturation=1.0):
+    """调整色彩饱和度（结果位于共享缓冲区，下次调用时会被覆盖）"""
+    return _saturation_adjuster(image, saturation)
+
+
+@functools.lru_cache(maxsize=8)
+def _gain_lut(red_gain, green_gain, blue_gain):
+    """构建RGB增益的 (1, 256, 3) 按通道查找表 (B, G, R顺序)"""
+    ramp = np.arange(256, dtype=np.float32)
+    lut = np.empty((1, 256, 3), dtype=np.uint8)
+    for i, gain in enumerate((blue_gain, green_gain, red_gain)):
+        lut[0, :, i] = np.clip(ramp * gain, 0, 255)
+    return lut
 
 
 def adjust_rgb_channels(image, red_gain=1.0, green_gain=1.0, blue_gain=1.0):
@@ -131,31 +213,59 @@ def adjust_rgb_channels(image, red_gain=1.0, green_gain=1.0, blue_gain=1.0):
     if red_gain == 1.0 and green_gain == 1.0 and blue_gain == 1.0:
         return image
     
-    b, g, r = cv2.split(image.astype(np.float32))
-    
-    r = np.clip(r * red_gain, 0, 255)
-    g = np.clip(g * green_gain, 0, 255)
-    b = np.clip(b * blue_gain, 0, 255)
-    
-    result = cv2.merge([b, g, r]).astype(np.uint8)
-    return result
+    # 按通道查找表一次完成，无需拆分/float32/合并
+    return cv2.LUT(image, _gain_lut(red_gain, green_gain, blue_gain))
 
 
-def apply_image_processing(frame, config):
-    """应用所有软件图像处理"""
-    frame = adjust_brightness_contrast(frame, 
-                                       config['brightness_offset'], 
-                                       config['contrast'])
-    
-    frame = adjust_saturation(frame, config['saturation'])
+def _is_unity(value):
+    """系数是否为1.0（容忍按键反复步进产生的浮点误差）"""
+    return math.isclose(value, 1.0, abs_tol=1e-6)
+
+
+# 恒等斜坡 (1x256x3)，用于把逐像素调整烘焙成查找表
+_IDENTITY_RAMP = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(1, 256, 3)
+
+
+@functools.lru_cache(maxsize=8)
+def _build_luts(brightness_offset, contrast, red_gain, green_gain, blue_gain):
+    """构建 (亮度对比度, RGB增益, 融合) 三张按通道查找表"""
+    # 让恒等斜坡经过原有函数，保证查找表与逐帧计算结果一致
+    tone = adjust_brightness_contrast(_IDENTITY_RAMP, brightness_offset, contrast)
+    gain = adjust_rgb_channels(_IDENTITY_RAMP, red_gain, green_gain, blue_gain)
+    fused = adjust_rgb_channels(tone, red_gain, green_gain, blue_gain)
+    return tone, gain, fused
+
+
+def apply_image_processing(frame, config, dst=None):
+    """应用所有软件图像处理（给定dst时结果写入dst）"""
+    tone_lut, gain_lut, fused_lut = _build_luts(config['brightness_offset'],
+                                                config['contrast'],
+                                                config['red_gain'],
+                                                config['green_gain'],
+                                                config['blue_gain'])
     
-    frame = adjust_rgb_channels(frame, 
-                               config['red_gain'], 
-                               config['green_gain'], 
-                               config['blue_gain'])
+    if _is_unity(config['saturation']):
+        # 亮度、对比度和RGB增益合并为一次查找表
+        frame = cv2.LUT(frame, fused_lut, dst=dst)
+    elif frame_pipeline.AVAILABLE:
+        # Numba内核一次遍历完成查找表和HSV饱和度, 无需颜色空间往返
+        out = dst if dst is not None else np.empty_like(frame)
+        frame_pipeline.process_pixels(frame, out, tone_lut[0], gain_lut[0],
+                                      float(config['saturation']))
+        frame = out
+    else:
+        # 饱和度位于亮度对比度与RGB增益之间；dst兼作中间缓冲区，
+        # 饱和度结果在调整器内部缓冲区中，不额外分配整帧数组
+        frame = cv2.LUT(frame, tone_lut, dst=dst)
+        frame = adjust_saturation(frame, config['saturation'])
+        frame = cv2.LUT(frame, gain_lut, dst=dst)
     
     if config['denoise']:
-        frame = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+        denoised = cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
+        if dst is not None:
+            np.copyto(dst, denoised)
+            denoised = dst
+        frame = denoised
     
     return frame
 
@@ -167,6 +277,12 @@ def apply_image_processing(frame, config):
 class FrameSelector:
     """基于模糊度和手部姿态选择最佳帧"""
     
+    # 信息叠加层的字体参数和各行基线位置 (模糊度, 手部, 帧评分, 最佳评分, 帮助)
+    _FONT = cv2.FONT_HERSHEY_SIMPLEX
+    _FONT_SCALE = 0.6
+    _THICKNESS = 2
+    _Y = (30, 65, 100, 135, 185)
+    
     def __init__(self, config):
         self.config = config
         self.blur_detector = BlurDetector()
@@ -182,6 +298,23 @@ class FrameSelector:
         self.best_frame = None
         self.best_score = -1
         
+        # 两个轮换缓冲区: best_frame 持有其中一个, _current_buffer 接收下一帧
+        # 评分提高时只交换引用, 不复制帧
+        self._current_buffer = None
+        # 显示用缓冲区: 叠加信息不能画在可能成为最佳帧的缓冲区上
+        self._display_buffer = None
+        
+        # 信息叠加层缓存: 文字每N帧渲染一次, 其余帧直接贴图
+        self._info_overlay = None
+        self._help_overlay = None
+        self._overlay_age = 0
+    
+    def acquire_buffer(self, shape):
+        """返回用于写入下一帧的缓冲区（不会与最佳帧共享内存）"""
+        if self._current_buffer is None or self._current_buffer.shape != shape:
+            self._current_buffer = np.empty(shape, dtype=np.uint8)
+        return self._current_buffer
+        
     def calculate_frame_score(self, frame, blur_score, hand_detected, hand_state, hand_confidence):
         """
         计算帧的综合评分
@@ -220,9 +353,17 @@ class FrameSelector:
         blur_score = self.blur_detector.calculate_blur_score(frame)
         is_blurry = blur_score < self.config['blur_threshold']
         
-        # 检测手部
-        hand_detected, annotated_frame, hand_count, hand_state, hand_confidence = \
-            self.hand_detector.detect(frame)
+        # 模糊帧即使手部检测满分也无法超过当前最佳评分时, 跳过手部检测
+        best_possible = self.calculate_frame_score(
+            frame, blur_score, True, self.config['target_hand_state'], 1.0
+        )
+        if is_blurry and best_possible <= self.best_score:
+            hand_detected, hand_state, hand_confidence = False, "UNKNOWN", 0.0
+            annotated_frame = frame
+        else:
+            # 检测手部
+            hand_detected, annotated_frame, hand_count, hand_state, hand_confidence = \
+                self.hand_detector.detect(frame)
         
         # 计算综合评分
         frame_score = self.calculate_frame_score(
@@ -232,7 +373,17 @@ class FrameSelector:
         # 更新最佳帧
         if frame_score > self.best_score:
             self.best_score = frame_score
-            self.best_frame = frame.copy()
+            if frame is not self._current_buffer:
+                np.copyto(self.acquire_buffer(frame.shape), frame)
+            # 当前缓冲区成为最佳帧, 旧的最佳帧缓冲区用于接收下一帧
+            self.best_frame, self._current_buffer = self._current_buffer, self.best_frame
+        
+        # 未绘制手部时检测器直接返回输入帧, 复制到显示缓冲区后再叠加信息
+        if annotated_frame is frame:
+            if self._display_buffer is None or self._display_buffer.shape != frame.shape:
+                self._display_buffer = np.empty_like(frame)
+            np.copyto(self._display_buffer, frame)
+            annotated_frame = self._display_buffer
         
         # 添加信息到显示帧
         self._add_info_overlay(
@@ -242,43 +393,73 @@ class FrameSelector:
         
         return annotated_frame, blur_score, hand_detected, hand_state, hand_confidence, frame_score
     
+    @staticmethod
+    def _crop_overlay(layer):
+        """裁剪出文字所在区域, 返回 (roi, 图像, 掩码)"""
+        mask = layer.any(axis=2)
+        ys, xs = np.nonzero(mask)
+        if len(ys) == 0:
+            return None
+        roi = (slice(ys.min(), ys.max() + 1), slice(xs.min(), xs.max() + 1))
+        return roi, layer[roi].copy(), mask[roi][..., None].copy()
+    
+    @staticmethod
+    def _blit_overlay(frame, overlay):
+        """把缓存的文字像素贴到帧上"""
+        if overlay is not None:
+            roi, image, mask = overlay
+            np.copyto(frame[roi], image, where=mask)
+    
     def _add_info_overlay(self, frame, blur_score, is_blurry, hand_detected, 
                           hand_state, hand_confidence, frame_score):
-        """在帧上添加信息叠加层"""
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.6
-        thickness = 2
-        y_offset = 30
+        """在帧上添加信息叠加层（文字每N帧重新渲染, 其余帧复用缓存）"""
+        shape = frame.shape
+        
+        # 帮助信息不变, 每种分辨率只渲染一次
+        if self._help_overlay is None or self._help_overlay[0] != shape:
+            layer = np.zeros(shape, dtype=np.uint8)
+            help_text = "按 'S' 保存最佳帧 | 按 'Q' 退出"
+            cv2.putText(layer, help_text, (10, self._Y[4]), self._FONT, 0.5, (255, 255, 255), 1)
+            self._help_overlay = (shape, self._crop_overlay(layer))
+        
+        if (self._info_overlay is None or self._info_overlay[0] != shape
+                or self._overlay_age >= self.config['overlay_refresh_interval']):
+            layer = np.zeros(shape, dtype=np.uint8)
+            self._render_info_text(layer, blur_score, is_blurry, hand_detected,
+                                   hand_state, hand_confidence, frame_score)
+            self._info_overlay = (shape, self._crop_overlay(layer))
+            self._overlay_age = 0
+        self._overlay_age += 1
+        
+        self._blit_overlay(frame, self._info_overlay[1])
+        self._blit_overlay(frame, self._help_overlay[1])
+    
+    def _render_info_text(self, frame, blur_score, is_blurry, hand_detected,
+                          hand_state, hand_confidence, frame_score):
+        """绘制会变化的评分信息"""
+        font, font_scale, thickness, y = self._FONT, self._FONT_SCALE, self._THICKNESS, self._Y
         
         # 模糊度信息
         blur_color = (0, 0, 255) if is_blurry else (0, 255, 0)
         blur_text = f"模糊度: {blur_score:.1f} {'[模糊]' if is_blurry else '[清晰]'}"
-        cv2.putText(frame, blur_text, (10, y_offset), font, font_scale, blur_color, thickness)
+        cv2.putText(frame, blur_text, (10, y[0]), font, font_scale, blur_color, thickness)
         
         # 手部检测信息
-        y_offset += 35
         if hand_detected:
             hand_text = f"手部: {hand_state} (置信度: {hand_confidence:.2f})"
             hand_color = (0, 255, 0) if hand_state == self.config['target_hand_state'] else (0, 165, 255)
         else:
             hand_text = "手部: 未检测到"
             hand_color = (0, 0, 255)
-        cv2.putText(frame, hand_text, (10, y_offset), font, font_scale, hand_color, thickness)
+        cv2.putText(frame, hand_text, (10, y[1]), font, font_scale, hand_color, thickness)
         
         # 综合评分
-        y_offset += 35
         score_text = f"帧评分: {frame_score:.1f}"
-        cv2.putText(frame, score_text, (10, y_offset), font, font_scale, (255, 255, 0), thickness)
+        cv2.putText(frame, score_text, (10, y[2]), font, font_scale, (255, 255, 0), thickness)
         
         # 最佳评分
-        y_offset += 35
         best_text = f"最佳评分: {self.best_score:.1f}"
-        cv2.putText(frame, best_text, (10, y_offset), font, font_scale, (255, 0, 255), thickness)
-        
-        # 帮助信息
-        y_offset += 50
-        help_text = "按 'S' 保存最佳帧 | 按 'Q' 退出"
-        cv2.putText(frame, help_text, (10, y_offset), font, 0.5, (255, 255, 255), 1)
+        cv2.putText(frame, best_text, (10, y[3]), font, font_scale, (255, 0, 255), thickness)
     
     def save_best_frame(self, output_path='best_frame.jpg'):
         """保存最佳帧"""
@@ -316,6 +497,9 @@ def main():
         print("错误: 无法打开相机")
         return
     
+    # 使用MJPG格式（需在分辨率之前设置）
+    set_mjpg_format(cap)
+    
     # 设置分辨率
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, camera_config['width'])
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, camera_config['height'])
@@ -329,6 +513,9 @@ def main():
     # 初始化帧选择器
     frame_selector = FrameSelector(FRAME_SELECTION_CONFIG)
     
+    # 预先编译Numba内核（有缓存时几乎不耗时）
+    frame_pipeline.warmup()
+    
     print("\n开始处理帧...")
     print(f"- 模糊度阈值: {FRAME_SELECTION_CONFIG['blur_threshold']}")
     print(f"- 目标手部状态: {FRAME_SELECTION_CONFIG['target_hand_state']}")
@@ -337,14 +524,22 @@ def main():
     
     frame_count = 0
     
+    # 预分配采集缓冲区, retrieve直接写入（尺寸不符时OpenCV会重新分配）
+    frame = np.empty((camera_config['height'], camera_config['width'], 3), dtype=np.uint8)
+    
     while True:
-        ret, frame = cap.read()
+        if not cap.grab():
+            print("错误: 无法捕获帧")
+            break
+        ret, frame = cap.retrieve(frame)
         if not ret:
             print("错误: 无法捕获帧")
             break
         
         # 应用图像处理
-        processed_frame = apply_image_processing(frame, camera_config)
+        # 直接写入帧选择器的轮换缓冲区, 成为最佳帧时无需复制
+        processed_frame = apply_image_processing(
+            frame, camera_config, dst=frame_selector.acquire_buffer(frame.shape))
         
         # 处理帧(模糊度检测 + 手部检测)
         display_frame, blur_score, hand_detected, hand_state, hand_confidence, frame_score = \
@@ -3,29 +3,45 @@ import mediapipe as mp
 import numpy as np
 from typing import Optional, Tuple
 
+# 五个指尖的关键点索引 (拇指, 食指, 中指, 无名指, 小指)
+_FINGERTIP_IDS = (4, 8, 12, 16, 20)
+# 指尖两两组合的索引 (共10对)
+_PAIR_I, _PAIR_J = np.triu_indices(len(_FINGERTIP_IDS), k=1)
+
 
 class HandDetector:
     """使用MediaPipe检测手部并分析手部状态"""
     
-    def __init__(self, min_detection_confidence: float = 0.7, min_tracking_confidence: float = 0.5):
+    def __init__(self, min_detection_confidence: float = 0.7, min_tracking_confidence: float = 0.5,
+                 detection_scale: float = 0.5):
         """
         初始化手部检测器
         
         Args:
             min_detection_confidence: 手部检测的最小置信度
             min_tracking_confidence: 手部跟踪的最小置信度
+            detection_scale: 送入MediaPipe前的缩放比例 (1.0 = 原分辨率)
         """
         self.mp_hands = mp.solutions.hands
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_drawing_styles = mp.solutions.drawing_styles
         
+        # 轻量模型 (model_complexity=0) 足以判断手指张开程度;
+        # _analyze_hand_state 只使用第一只手, 因此只检测一只
         self.hands = self.mp_hands.Hands(
             static_image_mode=False,
-            max_num_hands=2,
+            max_num_hands=1,
+            model_complexity=0,
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence
         )
         
+        self.detection_scale = detection_scale
+        
+        # 复用的缩放/RGB缓冲区（按输入尺寸懒分配）
+        self._small_buf = None
+        self._rgb_buf = None
+        
         self.last_detection_confidence = 0.0
         self.hand_count = 0
         self.hand_state = "UNKNOWN"
@@ -43,28 +59,12 @@ class HandDetector:
         """
         landmarks = hand_landmarks.landmark
         
-        # 获取五个指尖的坐标
-        thumb_tip = landmarks[4]
-        index_tip = landmarks[8]
-        middle_tip = landmarks[12]
-        ring_tip = landmarks[16]
-        pinky_tip = landmarks[20]
-        palm_base = landmarks[0]
-        
-        # 计算所有指尖之间的距离
-        distances = []
-        fingertips = [thumb_tip, index_tip, middle_tip, ring_tip, pinky_tip]
+        # 获取五个指尖的坐标 (5, 2)
+        tips = np.array([(landmarks[i].x, landmarks[i].y) for i in _FINGERTIP_IDS])
         
-        for i in range(len(fingertips)):
-            for j in range(i + 1, len(fingertips)):
-                dist = np.sqrt(
-                    (fingertips[i].x - fingertips[j].x) ** 2 +
-                    (fingertips[i].y - fingertips[j].y) ** 2
-                )
-                distances.append(dist)
-        
-        # 计算平均张开程度
-        avg_spread = np.mean(distances)
+        # 一次性计算所有指尖对之间的距离, 取平均张开程度
+        diff = tips[_PAIR_I] - tips[_PAIR_J]
+        avg_spread = float(np.sqrt((diff * diff).sum(axis=1)).mean())
         self.last_finger_spread = avg_spread
         
         # 根据张开程度判断手部状态
@@ -80,7 +80,7 @@ class HandDetector:
         Returns:
             (hand_detected, annotated_frame, hand_count, hand_state, confidence)
             - hand_detected: 是否检测到手部
-            - annotated_frame: 带标注的图像
+            - annotated_frame: 带标注的图像（未检测到手部时即为输入帧本身）
             - hand_count: 检测到的手部数量
             - hand_state: 手部状态 ("EMPTY", "HOLDING", "UNKNOWN")
             - confidence: 检测置信度
@@ -88,17 +88,32 @@ class HandDetector:
         if frame is None:
             return False, frame, 0, "UNKNOWN", 0.0
         
-        # 转换为RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # 在缩小的图像上检测（关键点为归一化坐标，可直接绘制到原图）
+        small = frame
+        if self.detection_scale != 1.0:
+            height, width = frame.shape[:2]
+            small_shape = (int(height * self.detection_scale),
+                           int(width * self.detection_scale), 3)
+            if self._small_buf is None or self._small_buf.shape != small_shape:
+                self._small_buf = np.empty(small_shape, dtype=np.uint8)
+            small = cv2.resize(frame, (small_shape[1], small_shape[0]), dst=self._small_buf,
+                               interpolation=cv2.INTER_AREA)
+        
+        # 转换为RGB（写入复用的缓冲区）
+        if self._rgb_buf is None or self._rgb_buf.shape != small.shape:
+            self._rgb_buf = np.empty_like(small)
+        rgb_frame = cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
         results = self.hands.process(rgb_frame)
         
-        annotated_frame = frame.copy()
+        # 只有需要绘制关键点时才复制原图
+        annotated_frame = frame
         hand_detected = False
         hand_count = 0
         
         if results.multi_hand_landmarks:
             hand_detected = True
             hand_count = len(results.multi_hand_landmarks)
+            annotated_frame = frame.copy()
             
             # 绘制手部关键点
             for hand_landmarks in results.multi_hand_landmarks:
@@ -8,8 +8,9 @@ import cv2
 import os
 import sys
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 # 添加分析模块路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -25,12 +26,24 @@ BASE_DIR = Path(__file__).parent
 BUFFER_DIR = BASE_DIR / 'capture' / 'buffer'
 SELECTED_DIR = BASE_DIR / 'selectedFrame'
 TOP_N = 3  # 选择前3张最清晰的图像
+SCORE_WORKERS = os.cpu_count() or 4  # 并行评分线程数（imread/Laplacian会释放GIL）
+# 评分时以1/2分辨率灰度解码JPEG（只需相对排序，libjpeg可跳过部分IDCT和颜色转换）
+SCORE_IMREAD_FLAG = cv2.IMREAD_REDUCED_GRAYSCALE_2
 
 
 # ============================================
 # 图像选择函数
 # ============================================
-def select_best_frames(buffer_dir: Path, output_dir: Path, top_n: int = 3) -> List[Tuple[str, float]]:
+def _score_image(image_path: Path) -> Optional[float]:
+    """读取单张图像并计算清晰度分数，读取失败时返回None"""
+    frame = cv2.imread(str(image_path), SCORE_IMREAD_FLAG)
+    if frame is None:
+        return None
+    return BlurDetector.calculate_blur_score(frame)
+
+
+def select_best_frames(buffer_dir: Path, output_dir: Path,
+                       top_n: int = 3) -> Tuple[List[Tuple[str, float]], List[Tuple[Path, float]]]:
     """
     从buffer目录中选择清晰度最高的前N张图像
     
@@ -40,7 +53,8 @@ def select_best_frames(buffer_dir: Path, output_dir: Path, top_n: int = 3) -> Li
         top_n: 选择前N张图像
     
     Returns:
-        选中的图像列表 [(文件名, 清晰度分数), ...]
+        (选中的图像列表 [(文件名, 清晰度分数), ...],
+         所有已评分图像 [(图像路径, 清晰度分数), ...])
     """
     print("="*70)
     print("图像选择程序 - 基于清晰度评分")
@@ -53,14 +67,14 @@ def select_best_frames(buffer_dir: Path, output_dir: Path, top_n: int = 3) -> Li
     # 检查buffer目录是否存在
     if not buffer_dir.exists():
         print(f"\n错误: Buffer目录不存在: {buffer_dir}")
-        return []
+        return [], []
     
     # 获取所有图像文件
     image_files = sorted([f for f in buffer_dir.glob('*.jpg')])
     
     if not image_files:
         print(f"\n错误: Buffer目录中没有找到图像文件")
-        return []
+        return [], []
     
     print(f"\n找到 {len(image_files)} 张图像")
     print("-"*70)
@@ -69,23 +83,22 @@ def select_best_frames(buffer_dir: Path, output_dir: Path, top_n: int = 3) -> Li
     print("正在计算清晰度分数...")
     image_scores = []
     
-    for i, image_path in enumerate(image_files):
-        # 读取图像
-        frame = cv2.imread(str(image_path))
-        
-        if frame is None:
+    # 多线程并行读取和评分，结果按文件顺序返回
+    with ThreadPoolExecutor(max_workers=SCORE_WORKERS) as executor:
+        scores = list(executor.map(_score_image, image_files))
+    
+    for i, (image_path, blur_score) in enumerate(zip(image_files, scores)):
+        if blur_score is None:
             print(f"  ⚠ 警告: 无法读取图像 {image_path.name}")
             continue
         
-        # 计算清晰度分数
-        blur_score = BlurDetector.calculate_blur_score(frame)
         image_scores.append((image_path, blur_score))
         
         print(f"  [{i+1:2d}/{len(image_files)}] {image_path.name}: 分数 = {blur_score:.2f}")
     
     if not image_scores:
         print("\n错误: 没有成功计算出任何图像的清晰度分数")
-        return []
+        return [], []
     
     print("-"*70)
     
@@ -112,23 +125,19 @@ def select_best_frames(buffer_dir: Path, output_dir: Path, top_n: int = 3) -> Li
     saved_files = []
     
     for i, (image_path, score) in enumerate(selected, 1):
-        # 读取图像
-        frame = cv2.imread(str(image_path))
+        # 创建新的文件名
+        output_filename = f"selected_{i:02d}_{image_path.name}"
+        output_path = output_dir / output_filename
         
-        if frame is not None:
-            # 创建新的文件名
-            output_filename = f"selected_{i:02d}_{image_path.name}"
-            output_path = output_dir / output_filename
-            
-            # 保存图像（高质量）
-            success = cv2.imwrite(str(output_path), frame, 
-                                 [cv2.IMWRITE_JPEG_QUALITY, 95])
-            
-            if success:
-                print(f"  ✓ 已保存: {output_filename} (分数: {score:.2f})")
-                saved_files.append((output_filename, score))
-            else:
-                print(f"  ✗ 保存失败: {output_filename}")
+        # 直接复制原文件（字节一致，无需重新解码/编码）
+        try:
+            shutil.copyfile(str(image_path), str(output_path))
+        except OSError as e:
+            print(f"  ✗ 保存失败: {output_filename} ({e})")
+            continue
+        
+        print(f"  ✓ 已保存: {output_filename} (分数: {score:.2f})")
+        saved_files.append((output_filename, score))
     
     print("\n" + "="*70)
     print("图像选择完成!")
@@ -137,35 +146,25 @@ def select_best_frames(buffer_dir: Path, output_dir: Path, top_n: int = 3) -> Li
     print(f"保存位置: {output_dir}")
     print("="*70)
     
-    return saved_files
+    return saved_files, image_scores
 
 
-def display_score_statistics(buffer_dir: Path):
-    """显示所有图像的清晰度统计信息"""
+def display_score_statistics(scores: List[float]):
+    """显示所有图像的清晰度统计信息（复用select_best_frames已计算的分数）"""
     print("\n" + "="*70)
     print("清晰度统计")
     print("="*70)
     
-    image_files = sorted([f for f in buffer_dir.glob('*.jpg')])
-    
-    if not image_files:
+    if not scores:
         print("没有图像文件")
         return
     
-    scores = []
-    for image_path in image_files:
-        frame = cv2.imread(str(image_path))
-        if frame is not None:
-            score = BlurDetector.calculate_blur_score(frame)
-            scores.append(score)
-    
-    if scores:
-        print(f"图像数量: {len(scores)}")
-        print(f"平均分数: {sum(scores)/len(scores):.2f}")
-        print(f"最高分数: {max(scores):.2f}")
-        print(f"最低分数: {min(scores):.2f}")
-        print(f"分数范围: {max(scores) - min(scores):.2f}")
-        print("="*70)
+    print(f"图像数量: {len(scores)}")
+    print(f"平均分数: {sum(scores)/len(scores):.2f}")
+    print(f"最高分数: {max(scores):.2f}")
+    print(f"最低分数: {min(scores):.2f}")
+    print(f"分数范围: {max(scores) - min(scores):.2f}")
+    print("="*70)
 
 
 # ============================================
@@ -175,11 +174,11 @@ def main():
     """主程序入口"""
     try:
         # 选择最佳帧
-        selected_files = select_best_frames(BUFFER_DIR, SELECTED_DIR, TOP_N)
+        selected_files, image_scores = select_best_frames(BUFFER_DIR, SELECTED_DIR, TOP_N)
         
         # 显示统计信息
         if BUFFER_DIR.exists():
-            display_score_statistics(BUFFER_DIR)
+            display_score_statistics([score for _, score in image_scores])
         
         if selected_files:
             print("\n程序执行成功!")
@@ -7,8 +7,9 @@ OpenAI Vision API 测试脚本
 import os
 import base64
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 import requests
 
 
@@ -22,6 +23,7 @@ RESULTS_DIR = BASE_DIR / 'api_results'
 # OpenAI API配置
 OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
 MODEL_NAME = "gpt-4o"  # 或 "gpt-4-turbo" 如果你有访问权限
+MAX_CONCURRENT_REQUESTS = 8  # 并发请求数上限（受OpenAI速率限制约束）
 
 # 识别提示词
 PROMPT = "Identify the object type and quantity in this image. Please provide a detailed description of what objects you see and how many of each."
@@ -32,8 +34,7 @@ PROMPT = "Identify the object type and quantity in this image. Please provide a
 # ============================================
 def encode_image_to_base64(image_path: Path) -> str:
     """将图像编码为base64字符串"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    return base64.b64encode(image_path.read_bytes()).decode('utf-8')
 
 
 def get_api_credentials() -> tuple:
@@ -62,7 +63,8 @@ def get_api_credentials() -> tuple:
     return api_key
 
 
-def analyze_image_with_openai(image_path: Path, api_key: str, prompt: str) -> Dict:
+def analyze_image_with_openai(image_path: Path, api_key: str, prompt: str,
+                              base64_image: Optional[str] = None) -> Dict:
     """
     使用OpenAI Vision API分析图像
     
@@ -70,15 +72,16 @@ def analyze_image_with_openai(image_path: Path, api_key: str, prompt: str) -> Di
         image_path: 图像文件路径
         api_key: OpenAI API密钥
         prompt: 分析提示词
+        base64_image: 预先编码的图像（为空时读取image_path编码）
     
     Returns:
         API响应结果
     """
-    print(f"\n正在分析: {image_path.name}")
-    print("-"*70)
+    print(f"正在分析: {image_path.name}")
     
     # 编码图像
-    base64_image = encode_image_to_base64(image_path)
+    if base64_image is None:
+        base64_image = encode_image_to_base64(image_path)
     
     # 构建请求
     headers = {
@@ -110,7 +113,6 @@ def analyze_image_with_openai(image_path: Path, api_key: str, prompt: str) -> Di
     
     try:
         # 发送请求
-        print("正在发送请求到OpenAI API...")
         response = requests.post(OPENAI_API_URL, headers=headers, json=payload, timeout=60)
         response.raise_for_status()
         
@@ -119,12 +121,6 @@ def analyze_image_with_openai(image_path: Path, api_key: str, prompt: str) -> Di
         # 提取响应内容
         if 'choices' in result and len(result['choices']) > 0:
             content = result['choices'][0]['message']['content']
-            print(f"\n✓ 分析完成!")
-            print(f"\n响应内容:")
-            print("-"*70)
-            print(content)
-            print("-"*70)
-            
             return {
                 'success': True,
                 'image': image_path.name,
@@ -133,7 +129,6 @@ def analyze_image_with_openai(image_path: Path, api_key: str, prompt: str) -> Di
                 'usage': result.get('usage', {})
             }
         else:
-            print("✗ API响应格式异常")
             return {
                 'success': False,
                 'image': image_path.name,
@@ -142,14 +137,32 @@ def analyze_image_with_openai(image_path: Path, api_key: str, prompt: str) -> Di
             }
             
     except requests.exceptions.RequestException as e:
-        print(f"\n✗ 请求失败: {e}")
-        if hasattr(e.response, 'text'):
-            print(f"错误详情: {e.response.text}")
-        return {
+        result = {
             'success': False,
             'image': image_path.name,
             'error': str(e)
         }
+        if hasattr(e.response, 'text'):
+            result['error_detail'] = e.response.text
+        return result
+
+
+def print_analysis_result(result: Dict):
+    """显示单张图像的分析结果"""
+    print(f"\n{result['image']}")
+    print("-"*70)
+    if result['success']:
+        print(f"✓ 分析完成!")
+        print(f"\n响应内容:")
+        print("-"*70)
+        print(result['response'])
+        print("-"*70)
+    elif result.get('error') == 'Invalid response format':
+        print("✗ API响应格式异常")
+    else:
+        print(f"✗ 请求失败: {result['error']}")
+        if 'error_detail' in result:
+            print(f"错误详情: {result['error_detail']}")
 
 
 def save_results(results: List[Dict], output_dir: Path):
@@ -222,12 +235,19 @@ def main():
         print("开始分析图像")
         print("="*70)
         
-        # 分析每张图像
-        results = []
-        for i, image_path in enumerate(image_files, 1):
+        # 并行编码并发送请求（网络I/O期间释放GIL），结果按文件顺序输出
+        max_workers = min(MAX_CONCURRENT_REQUESTS, len(image_files))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            encoded_images = list(executor.map(encode_image_to_base64, image_files))
+            futures = [
+                executor.submit(analyze_image_with_openai, image_path, api_key, PROMPT, encoded)
+                for image_path, encoded in zip(image_files, encoded_images)
+            ]
+            results = [future.result() for future in futures]
+        
+        for i, result in enumerate(results, 1):
             print(f"\n[{i}/{len(image_files)}]")
-            result = analyze_image_with_openai(image_path, api_key, PROMPT)
-            results.append(result)
+            print_analysis_result(result)
         
         # 保存结果
         save_results(results, RESULTS_DIR)